@@ -1,55 +1,441 @@
+import csv
+import hashlib
+import io
 import os
+import shutil
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for
+import threading
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, make_response
 from flask_cors import CORS
 from nlp import predict_category, extract_text_from_image, transcribe_audio
-import pandas as pd  # For CSV export
+
+try:
+    import fcntl  # POSIX only; used to lock the CSV across worker processes
+except ImportError:
+    fcntl = None
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 CORS(app)
 
+# Templates never change at runtime: no reload checks, unbounded compiled-template cache
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
+app.jinja_env.cache = {}
+
 DB_PATH = "data/complaints.db"
 CSV_PATH = "data/all_complaints.csv"
+CSV_LOCK_PATH = CSV_PATH + ".lock"
+CSV_COLUMNS = ["id", "username", "village_name", "text", "category", "type", "timestamp"]
+PENDING_CATEGORY = "Pending"
+
+# Full complaint row; the (possibly large) text lives in its own table
+COMPLAINT_ROW_SQL = (
+    "SELECT c.id, c.username, c.village_name, t.text, c.category, c.type, c.timestamp "
+    "FROM complaints c LEFT JOIN complaint_texts t ON t.id = c.id"
+)
 
 # -------------------------------
 # Initialize Database
 # -------------------------------
-def init_db():
+def _connect():
+    """Open the shared SQLite connection with WAL and tuned pragmas."""
     os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS complaints (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT,
-        village_name TEXT,
-        text TEXT,
-        category TEXT,
-        type TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    conn.commit()
-    conn.close()
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+# One long-lived connection shared by all requests; the lock serializes access
+_conn = _connect()
+_db_lock = threading.Lock()
+
+# Serializes CSV writes within this process; see _csv_file_lock
+_csv_lock = threading.Lock()
+
+def _reopen_after_fork():
+    # SQLite connections and worker threads must not be shared across processes (gunicorn --preload)
+    global _conn, _db_lock, _csv_lock, _executor, _executor_lock, _resume_lock
+    _conn = _connect()
+    _db_lock = threading.Lock()
+    _csv_lock = threading.Lock()
+    _executor = None
+    _executor_lock = threading.Lock()
+    _resume_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reopen_after_fork)
+
+def _migrate_complaint_texts():
+    """Move text out of databases created with the old inline `text` column."""
+    columns = [row[1] for row in _conn.execute("PRAGMA table_info(complaints)")]
+    if "text" not in columns:
+        return
+    with _conn:
+        _conn.execute("BEGIN IMMEDIATE")
+        _conn.execute(
+            "INSERT OR IGNORE INTO complaint_texts (id, text) "
+            "SELECT id, text FROM complaints WHERE text IS NOT NULL"
+        )
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            _conn.execute("ALTER TABLE complaints DROP COLUMN text")
+        else:
+            _conn.execute("UPDATE complaints SET text = NULL WHERE text IS NOT NULL")
+    print("✅ Complaint texts migrated")
+
+def init_db():
+    with _db_lock:
+        _conn.execute("""
+        CREATE TABLE IF NOT EXISTS complaints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            village_name TEXT,
+            category TEXT,
+            type TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        # Complaint text is kept apart so metadata scans stay small
+        _conn.execute("""
+        CREATE TABLE IF NOT EXISTS complaint_texts (
+            id INTEGER PRIMARY KEY REFERENCES complaints(id),
+            text TEXT
+        )
+        """)
+        _migrate_complaint_texts()
+        # Indexes for the admin listing order and per-user lookups
+        # id breaks same-second timestamp ties so pages are stable, newest first
+        _conn.execute("DROP INDEX IF EXISTS idx_complaints_ts_desc")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_complaints_ts_id_desc ON complaints(timestamp DESC, id DESC)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_complaints_user ON complaints(username)")
+        # Small partial index so the dashboard ETag can count unprocessed rows cheaply
+        _conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_complaints_pending ON complaints(id) "
+            f"WHERE category = '{PENDING_CATEGORY}'"
+        )
+        # Queued background jobs, so a restart can pick them up again
+        _conn.execute("""
+        CREATE TABLE IF NOT EXISTS pending_jobs (
+            id INTEGER PRIMARY KEY REFERENCES complaints(id),
+            ctype TEXT,
+            file_path TEXT
+        )
+        """)
+        # OCR/transcription results keyed by the SHA-256 of the uploaded file and its kind.
+        # Older caches keyed on sha256 alone are just dropped and rebuilt.
+        pk_columns = [row[1] for row in _conn.execute("PRAGMA table_info(media_cache)") if row[5]]
+        if pk_columns == ["sha256"]:
+            _conn.execute("DROP TABLE media_cache")
+        _conn.execute("""
+        CREATE TABLE IF NOT EXISTS media_cache (
+            sha256 TEXT,
+            kind TEXT,
+            text TEXT,
+            PRIMARY KEY (sha256, kind)
+        )
+        """)
     print("✅ Database initialized")
 
 # -------------------------------
 # Export to CSV
 # -------------------------------
-def update_csv():
-    """Export all complaints to CSV."""
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        df = pd.read_sql_query("SELECT * FROM complaints", conn)
+@contextmanager
+def _csv_file_lock():
+    """
+    Serialize CSV writes across threads and gunicorn worker processes.
+    Always taken before _db_lock, never while holding it.
+    """
+    with _csv_lock:
+        if fcntl is None:
+            yield
+            return
         os.makedirs("data", exist_ok=True)
-        df.to_csv(CSV_PATH, index=False)
-        print("✅ CSV updated")
+        with open(CSV_LOCK_PATH, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _open_readonly():
+    # Separate read-only connection: WAL lets it read alongside the writer
+    return sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+
+def _export_cursor(conn):
+    # Pending rows are appended by the worker once processed
+    return conn.execute(
+        COMPLAINT_ROW_SQL + " WHERE c.category != ? ORDER BY c.id", (PENDING_CATEGORY,)
+    )
+
+def append_csv(rows):
+    """Append complaint rows to the CSV (header only for a new file)."""
+    os.makedirs("data", exist_ok=True)
+    write_header = not os.path.exists(CSV_PATH)
+    with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
+
+def export_csv():
+    """
+    Rebuild the full CSV by streaming processed rows from a SQLite cursor
+    into a temp file that then replaces the CSV in one step.
+    """
+    os.makedirs("data", exist_ok=True)
+    with _csv_file_lock():
+        fd, tmp_path = tempfile.mkstemp(dir="data", suffix=".csv.tmp")
+        conn = _open_readonly()
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                cursor = _export_cursor(conn)
+                writer.writerow([d[0] for d in cursor.description])
+                writer.writerows(cursor)
+            os.replace(tmp_path, CSV_PATH)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        finally:
+            conn.close()
+    print("✅ CSV exported")
+
+def iter_csv_export(chunk_size=1 << 16):
+    """Yield the processed complaints as CSV text, straight from a SQLite cursor."""
+    conn = _open_readonly()
+    try:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        cursor = _export_cursor(conn)
+        writer.writerow([d[0] for d in cursor.description])
+        for row in cursor:
+            writer.writerow(row)
+            if buf.tell() >= chunk_size:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
     finally:
         conn.close()
 
+# -------------------------------
+# Bulk Import
+# -------------------------------
+def bulk_insert_complaints(rows):
+    """
+    Insert many (username, village_name, text, category, type) tuples
+    with one executemany inside a single transaction.
+    Use this for any bulk/seed import instead of per-row inserts.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    with _csv_file_lock():
+        with _db_lock, _conn:
+            _conn.execute("BEGIN IMMEDIATE")
+            last_id = _conn.execute("SELECT COALESCE(MAX(id), 0) FROM complaints").fetchone()[0]
+            _conn.executemany(
+                "INSERT INTO complaints (username, village_name, category, type) VALUES (?,?,?,?)",
+                [(username, village_name, category, ctype)
+                 for username, village_name, _, category, ctype in rows]
+            )
+            new_ids = [row[0] for row in _conn.execute(
+                "SELECT id FROM complaints WHERE id > ? ORDER BY id", (last_id,)
+            )]
+            _conn.executemany(
+                "INSERT INTO complaint_texts (id, text) VALUES (?,?)",
+                [(complaint_id, row[2]) for complaint_id, row in zip(new_ids, rows)]
+            )
+            inserted = _conn.execute(
+                COMPLAINT_ROW_SQL + " WHERE c.id > ? ORDER BY c.id", (last_id,)
+            ).fetchall()
+
+        append_csv(inserted)
+    return len(inserted)
+
 # Initialize DB once at import (safe)
 init_db()
 
+# Compile all templates up front so preloaded workers share them
+for _template in app.jinja_env.list_templates():
+    app.jinja_env.get_template(_template)
+
+# -------------------------------
+# Background processing (OCR / ASR / prediction)
+# -------------------------------
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", 2))
+RESUME_LOCK_PATH = "data/pending_jobs.lock"
+
+# Created lazily in each process; a pool started before a fork has no threads in the child
+_executor = None
+_executor_lock = threading.Lock()
+
+# Pending jobs are resumed by a single serving process, not the preloading master
+_resume_lock = threading.Lock()
+_resume_done = False
+_resume_lock_file = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+    return _executor
+
+# Serverless deployments (Vercel) may freeze the process after the response,
+# so complaints are processed inline there
+PROCESS_INLINE = bool(os.environ.get("VERCEL"))
+
+UPLOAD_BUFFER_SIZE = 1 << 20
+
+def _save_upload(file, file_path):
+    """
+    Copy an upload to disk with a 1 MiB buffer and ask the kernel to keep
+    it cached, since it is read back right away for hashing and OCR/ASR.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    fd = os.open(file_path, flags, 0o644)
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(file.stream, out, length=UPLOAD_BUFFER_SIZE)
+        out.flush()
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+
+def _file_sha256(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _extract_media_text(ctype, file_path):
+    """OCR/transcribe an upload, reusing the cached text for identical files."""
+    digest = _file_sha256(file_path)
+    with _db_lock:
+        row = _conn.execute(
+            "SELECT text FROM media_cache WHERE sha256 = ? AND kind = ?", (digest, ctype)
+        ).fetchone()
+    if row is not None:
+        return row[0]
+
+    if ctype == "image":
+        text = extract_text_from_image(file_path)
+    else:
+        text = transcribe_audio(file_path)
+
+    with _db_lock:
+        _conn.execute(
+            "INSERT OR IGNORE INTO media_cache (sha256, kind, text) VALUES (?,?,?)",
+            (digest, ctype, text)
+        )
+    return text
+
+def _upload_path(filename):
+    """Unique path under data/ for an upload, keeping only a safe extension."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not ext[1:].isalnum():
+        ext = ""
+    return os.path.join("data", f"upload_{uuid.uuid4().hex}{ext}")
+
+def _process_complaint(complaint_id, ctype, text, file_path=None):
+    """Extract text if needed, predict the category and update the stored row."""
+    category = None
+    try:
+        if ctype in ["image", "audio"] and file_path:
+            text = _extract_media_text(ctype, file_path)
+    except Exception as e:
+        # Don't guess a category from empty text
+        category = "Unknown"
+        print("Error extracting complaint text:", e)
+
+    # Predict category
+    if category is None:
+        try:
+            category = predict_category(text)
+        except Exception as e:
+            category = "Unknown"
+            print("Error predicting category:", e)
+
+    with _csv_file_lock():
+        with _db_lock, _conn:
+            _conn.execute("BEGIN IMMEDIATE")
+            _conn.execute("DELETE FROM pending_jobs WHERE id = ?", (complaint_id,))
+            # Only the first job to finish a complaint records it (restarts may re-run jobs)
+            updated = _conn.execute(
+                "UPDATE complaints SET category = ? WHERE id = ? AND category = ?",
+                (category, complaint_id, PENDING_CATEGORY)
+            ).rowcount
+            row = None
+            if updated:
+                _conn.execute(
+                    "INSERT OR REPLACE INTO complaint_texts (id, text) VALUES (?,?)", (complaint_id, text)
+                )
+                row = _conn.execute(
+                    COMPLAINT_ROW_SQL + " WHERE c.id = ?", (complaint_id,)
+                ).fetchone()
+
+        # Append the processed row to the CSV (no full re-export)
+        if row is not None:
+            append_csv([row])
+
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+
+def _submit_complaint(complaint_id, ctype, text, file_path=None):
+    if PROCESS_INLINE:
+        _process_complaint(complaint_id, ctype, text, file_path)
+    else:
+        _get_executor().submit(_process_complaint, complaint_id, ctype, text, file_path)
+
+def _resume_pending_jobs():
+    """Re-queue jobs left unfinished by a previous run."""
+    with _db_lock:
+        jobs = _conn.execute(
+            "SELECT j.id, j.ctype, t.text, j.file_path FROM pending_jobs j "
+            "LEFT JOIN complaint_texts t ON t.id = j.id ORDER BY j.id"
+        ).fetchall()
+    for complaint_id, ctype, text, file_path in jobs:
+        _submit_complaint(complaint_id, ctype, text or "", file_path)
+    if jobs:
+        print(f"✅ Resumed {len(jobs)} pending complaint(s)")
+
+def _claim_resume():
+    """
+    True for the one process that should resume pending jobs: it keeps an
+    exclusive flock on RESUME_LOCK_PATH for as long as it lives.
+    """
+    global _resume_lock_file
+    if fcntl is None:
+        return True
+    lock_file = open(RESUME_LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _resume_lock_file = lock_file
+    return True
+
+@app.before_request
+def _resume_pending_jobs_once():
+    # Runs in serving processes only (after any gunicorn fork), once per process
+    global _resume_done
+    if _resume_done or PROCESS_INLINE:
+        return
+    with _resume_lock:
+        if _resume_done:
+            return
+        _resume_done = True
+        if _claim_resume():
+            _resume_pending_jobs()
+
 # -------------------------------
 # Routes
 # -------------------------------
@@ -73,59 +459,112 @@ def login():
 @app.route("/complaint/<username>", methods=["GET","POST"])
 def complaint_page(username):
     message = ""
+    complaint_id = None
     if request.method == "POST":
         village_name = request.form.get("village_name", "")
         ctype = request.form.get("ctype", "text")
         text = ""
+        file_path = None
 
-        # Extract complaint text based on type
+        # Collect complaint text or the uploaded file based on type
         if ctype == "text":
             text = request.form.get("complaint_text", "")
         elif ctype in ["image", "audio"]:
             file = request.files.get("file")
             if file:
-                # keep filename safe in production; here keep simple
-                file_path = os.path.join("data", file.filename)
-                file.save(file_path)
-                if ctype == "image":
-                    text = extract_text_from_image(file_path)
-                else:
-                    text = transcribe_audio(file_path)
-
-        # Predict category
-        try:
-            category = predict_category(text)
-        except Exception as e:
-            category = "Unknown"
-            print("Error predicting category:", e)
+                # Unique name so same-named uploads never overwrite each other
+                file_path = _upload_path(file.filename)
+                _save_upload(file, file_path)
 
-        # Insert into DB
-        conn = sqlite3.connect(DB_PATH)
-        try:
-            conn.execute(
-                "INSERT INTO complaints (username, village_name, text, category, type) VALUES (?,?,?,?,?)",
-                (username, village_name, text, category, ctype)
-            )
-            conn.commit()
-        finally:
-            conn.close()
+        # Insert a pending row now; the category is filled in by the worker
+        with _db_lock:
+            with _conn:
+                _conn.execute("BEGIN IMMEDIATE")
+                cursor = _conn.execute(
+                    "INSERT INTO complaints (username, village_name, category, type) VALUES (?,?,?,?)",
+                    (username, village_name, PENDING_CATEGORY, ctype)
+                )
+                complaint_id = cursor.lastrowid
+                _conn.execute(
+                    "INSERT INTO complaint_texts (id, text) VALUES (?,?)", (complaint_id, text)
+                )
+                _conn.execute(
+                    "INSERT INTO pending_jobs (id, ctype, file_path) VALUES (?,?,?)",
+                    (complaint_id, ctype, file_path)
+                )
+
+        _submit_complaint(complaint_id, ctype, text, file_path)
 
-        # Update CSV immediately
-        update_csv()
+        message = "✅ Complaint submitted! Processing..."
 
-        message = f"✅ Complaint submitted! Predicted category: {category}"
+    return render_template("complaint.html", username=username, message=message,
+                           complaint_id=complaint_id)
 
-    return render_template("complaint.html", username=username, message=message)
+# -------- Complaint Status (polled by the complaint page) --------
+@app.route("/status/<int:complaint_id>")
+def complaint_status(complaint_id):
+    with _db_lock:
+        row = _conn.execute(
+            "SELECT category FROM complaints WHERE id = ?", (complaint_id,)
+        ).fetchone()
+    if row is None:
+        return jsonify({"error": "Complaint not found"}), 404
+    return jsonify({
+        "id": complaint_id,
+        "category": row[0],
+        "done": row[0] != PENDING_CATEGORY,
+    })
 
 # -------- Admin Dashboard --------
+ADMIN_PAGE_SIZE = 50
+
 @app.route("/admin")
 def admin_dashboard():
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        complaints = conn.execute("SELECT * FROM complaints ORDER BY timestamp DESC").fetchall()
-    finally:
-        conn.close()
-    return render_template("admin_dashboard.html", complaints=complaints)
+    page = max(request.args.get("page", 0, type=int), 0)
+    with _db_lock:
+        # The listing only changes on new rows or when pending rows get categorized
+        version = _conn.execute(
+            "SELECT COALESCE(MAX(id), 0) || ':' || COUNT(*) || ':' || "
+            "(SELECT COUNT(*) FROM complaints WHERE category = ?) FROM complaints",
+            (PENDING_CATEGORY,)
+        ).fetchone()[0]
+    tag = f"{version}:{page}"
+    if tag in request.if_none_match:
+        resp = make_response("", 304)
+        resp.set_etag(tag)
+        return resp
+
+    # Fetch one extra row to know whether a next page exists; text is left out of the listing
+    with _db_lock:
+        complaints = _conn.execute(
+            "SELECT id, username, village_name, category, type, timestamp FROM complaints "
+            "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+            (ADMIN_PAGE_SIZE + 1, page * ADMIN_PAGE_SIZE)
+        ).fetchall()
+    has_next = len(complaints) > ADMIN_PAGE_SIZE
+    resp = make_response(render_template("admin_dashboard.html", complaints=complaints[:ADMIN_PAGE_SIZE],
+                                         page=page, has_next=has_next))
+    resp.set_etag(tag)
+    return resp
+
+# -------- CSV Export --------
+@app.route("/admin/export")
+def admin_export():
+    # Streamed from the database, so concurrent appends/exports can't affect the download
+    return Response(iter_csv_export(), mimetype="text/csv", headers={
+        "Content-Disposition": "attachment; filename=all_complaints.csv",
+    })
+
+# -------- Complaint Detail --------
+@app.route("/admin/complaint/<int:complaint_id>")
+def complaint_detail(complaint_id):
+    with _db_lock:
+        complaint = _conn.execute(
+            COMPLAINT_ROW_SQL + " WHERE c.id = ?", (complaint_id,)
+        ).fetchone()
+    if complaint is None:
+        return "Complaint not found", 404
+    return render_template("complaint_detail.html", complaint=complaint)
 
 # -------------------------------
 # Run App (Render uses PORT env var)
@@ -1,72 +1,298 @@
 import os
+import queue
+import re
+import threading
+import time
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
 from sklearn.pipeline import Pipeline
+from sklearn.utils import murmurhash3_32
 import joblib
 
-# ----- AI Libraries -----
-import easyocr
-reader = easyocr.Reader(['en'])  # For handwritten complaints
-
-import whisper
-model_whisper = whisper.load_model("base")  # For audio complaints
-
 # ----- Paths -----
 DATA_PATH = "data/complaints.csv"
 MODEL_PATH = "models/grievance_model.pkl"
 
+# ----- Cached classifier (loaded once, not per request) -----
+def _build_fast_predictor(model):
+    """
+    Extract token lookup, IDF weights and linear coefficients from the trained
+    pipeline as plain dict/NumPy arrays for the hot prediction path.
+    Supports TfidfVectorizer -> clf and HashingVectorizer -> TfidfTransformer -> clf.
+    Returns None when the pipeline uses options this path does not replicate,
+    or when its attributes can't be read (e.g. a model pickled by another
+    sklearn version), so predictions fall back to model.predict.
+    """
+    if model is None:
+        return None
+    try:
+        return _extract_fast_predictor(model)
+    except Exception as e:
+        print("Fast predictor unavailable, using model.predict:", e)
+        return None
+
+def _extract_fast_predictor(model):
+    steps = model.named_steps
+    if "clf" not in steps or "tfidf" not in steps:
+        return None
+    clf = steps["clf"]
+    tfidf = steps["tfidf"]
+    vec = steps["vect"] if "vect" in steps else tfidf
+
+    if (vec.analyzer != "word" or vec.ngram_range != (1, 1) or vec.tokenizer is not None
+            or vec.preprocessor is not None or vec.strip_accents is not None or vec.binary
+            or not tfidf.use_idf or tfidf.sublinear_tf or tfidf.norm != "l2"):
+        return None
+
+    if isinstance(vec, TfidfVectorizer):
+        lookup = dict(vec.vocabulary_).get
+    elif isinstance(vec, HashingVectorizer) and not vec.alternate_sign:
+        # Same bucket as sklearn's hasher; the inner L2 norm cancels out under the outer one
+        n_features = vec.n_features
+        stop_words = vec.get_stop_words() or frozenset()
+        def lookup(token):
+            if token in stop_words:
+                return None
+            return abs(murmurhash3_32(token, seed=0)) % n_features
+    else:
+        return None
+
+    # int8 weights with a per-class scale; only the argmax is needed downstream
+    coef = np.asarray(clf.coef_, dtype=np.float64)
+    scale = np.abs(coef).max(axis=1, keepdims=True) / 127
+    scale[scale == 0] = 1.0
+    qcoef = np.round(coef / scale).astype(np.int8)
+
+    return {
+        "tokenize": re.compile(vec.token_pattern).findall,
+        "lowercase": vec.lowercase,
+        "lookup": lookup,
+        "idf": np.asarray(tfidf.idf_, dtype=np.float64),
+        "qcoef": qcoef,
+        "scale": scale.ravel(),
+        "intercept": np.asarray(clf.intercept_, dtype=np.float64),
+        "classes": np.asarray(clf.classes_),
+    }
+
+_MODEL = joblib.load(MODEL_PATH) if os.path.exists(MODEL_PATH) else None
+_FAST_MODEL = _build_fast_predictor(_MODEL)
+_MODEL_LOCK = threading.Lock()
+
+# ----- AI Libraries (loaded lazily on first use) -----
+WHISPER_MODEL_SIZE = os.environ.get("WHISPER_MODEL_SIZE", "base")
+_reader = None          # EasyOCR, for handwritten complaints
+_model_whisper = None   # Whisper, for audio complaints
+_ai_lock = threading.Lock()
+
+def _use_gpu():
+    """True when a CUDA device is available for OCR/ASR inference."""
+    import torch
+    return torch.cuda.is_available()
+
+def _get_reader():
+    global _reader
+    if _reader is None:
+        with _ai_lock:
+            if _reader is None:
+                import easyocr
+                _reader = easyocr.Reader(['en'], gpu=_use_gpu())
+    return _reader
+
+def _get_whisper():
+    global _model_whisper
+    if _model_whisper is None:
+        with _ai_lock:
+            if _model_whisper is None:
+                import whisper
+                device = "cuda" if _use_gpu() else "cpu"
+                _model_whisper = whisper.load_model(WHISPER_MODEL_SIZE, device=device)
+    return _model_whisper
+
+# ----- Micro-batching for concurrent predictions -----
+PREDICT_MAX_BATCH = 32
+PREDICT_BATCH_WAIT = 0.005  # seconds to wait for more texts to join a batch
+_predict_queue = queue.Queue()
+_batch_thread = None
+_batch_thread_lock = threading.Lock()
+
 # ----- 1. Train AI model -----
+TRAIN_CHUNK_SIZE = 50_000
+TRAIN_EPOCHS = 5
+
+def _read_training_chunks():
+    """
+    Stream the dataset in chunks, yielding the 80% training split of each.
+    Only the needed columns are loaded, with compact dtypes.
+    """
+    required_cols = ["Complaint_Text", "Category"]
+    chunks = pd.read_csv(
+        DATA_PATH,
+        usecols=lambda col: col in required_cols,
+        dtype={"Complaint_Text": "string", "Category": "category"},
+        chunksize=TRAIN_CHUNK_SIZE,
+    )
+    for chunk in chunks:
+        # Check required columns exist
+        for col in required_cols:
+            if col not in chunk.columns:
+                raise ValueError(f"Dataset missing required column: {col}")
+
+        X = chunk["Complaint_Text"]
+        y = chunk["Category"].astype(str)
+
+        # Train/test split (too-small tail chunks are used whole)
+        if len(chunk) >= 5:
+            X, X_test, y, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=42
+            )
+        yield X, y
+
 def train_model():
     """
     Train a complaint category classifier using your dataset.
     Expects 'Complaint_Text' as input and 'Category' as target.
+    The CSV is streamed in chunks so memory stays bounded by the chunk size.
     Saves trained model to models/grievance_model.pkl
     """
     if not os.path.exists(DATA_PATH):
         raise FileNotFoundError(f"{DATA_PATH} not found. Add your dataset first.")
 
-    df = pd.read_csv(DATA_PATH)
+    # Pipeline: hashed TF-IDF + SGD logistic regression (trainable online)
+    vectorizer = HashingVectorizer(
+        stop_words="english", n_features=2**18, alternate_sign=False, dtype=np.float32
+    )
+    tfidf = TfidfTransformer()
+    clf = SGDClassifier(loss="log_loss", max_iter=20, n_jobs=-1, random_state=42)
 
-    # Check required columns exist
-    required_cols = ["Complaint_Text", "Category"]
-    for col in required_cols:
-        if col not in df.columns:
-            raise ValueError(f"Dataset missing required column: {col}")
+    # Pass 1: document frequencies and the full set of classes
+    n_samples = 0
+    doc_freq = np.zeros(vectorizer.n_features, dtype=np.int64)
+    classes = set()
+    for X_chunk, y_chunk in _read_training_chunks():
+        counts = vectorizer.transform(X_chunk)
+        doc_freq += np.bincount(counts.indices, minlength=vectorizer.n_features)
+        n_samples += counts.shape[0]
+        classes.update(y_chunk)
 
-    X = df["Complaint_Text"]
-    y = df["Category"]
+    # Smoothed IDF, as TfidfTransformer.fit would compute it
+    tfidf.idf_ = np.log((1 + n_samples) / (1 + doc_freq)) + 1
+    tfidf.n_features_in_ = vectorizer.n_features
+    classes = np.array(sorted(classes))
 
-    # Train/test split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    # Pass 2: online updates, one partial_fit per chunk
+    for _ in range(TRAIN_EPOCHS):
+        for X_chunk, y_chunk in _read_training_chunks():
+            clf.partial_fit(tfidf.transform(vectorizer.transform(X_chunk)), y_chunk, classes=classes)
 
-    # Pipeline: TF-IDF + Logistic Regression
     model = Pipeline([
-        ("tfidf", TfidfVectorizer(stop_words="english")),
-        ("clf", LogisticRegression(max_iter=1000))
+        ("vect", vectorizer),
+        ("tfidf", tfidf),
+        ("clf", clf)
     ])
-
-    model.fit(X_train, y_train)
-    print(f"✅ Model trained on {len(X_train)} samples.")
+    print(f"✅ Model trained on {n_samples} samples.")
 
     # Save model
     os.makedirs("models", exist_ok=True)
     joblib.dump(model, MODEL_PATH)
     print(f"✅ Model saved to {MODEL_PATH}")
 
+    # Refresh the cached model so predictions use the new one
+    global _MODEL, _FAST_MODEL
+    with _MODEL_LOCK:
+        _MODEL = model
+        _FAST_MODEL = _build_fast_predictor(model)
+
 # ----- 2. Predict category -----
+def _batch_worker():
+    """
+    Drain queued texts in groups of up to PREDICT_MAX_BATCH and classify
+    each group with a single model.predict call.
+    """
+    while True:
+        batch = [_predict_queue.get()]
+        deadline = time.monotonic() + PREDICT_BATCH_WAIT
+        while len(batch) < PREDICT_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_predict_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            with _MODEL_LOCK:
+                predictions = _MODEL.predict([item["text"] for item in batch])
+            for item, prediction in zip(batch, predictions):
+                item["result"] = prediction
+        except Exception as e:
+            for item in batch:
+                item["error"] = e
+        finally:
+            for item in batch:
+                item["done"].set()
+
+def _ensure_batch_thread():
+    # Started lazily so forked workers (gunicorn --preload) each get their own
+    global _batch_thread
+    if _batch_thread is not None and _batch_thread.is_alive():
+        return
+    with _batch_thread_lock:
+        if _batch_thread is None or not _batch_thread.is_alive():
+            _batch_thread = threading.Thread(target=_batch_worker, daemon=True)
+            _batch_thread.start()
+
+def _fast_predict(fast, text):
+    """
+    TF-IDF + logistic regression scoring without the sklearn call overhead:
+    tokenize, look up vocabulary ids, L2-normalize and dot with the int8 coefficients.
+    """
+    if fast["lowercase"]:
+        text = text.lower()
+
+    lookup = fast["lookup"]
+    counts = {}
+    for token in fast["tokenize"](text):
+        idx = lookup(token)
+        if idx is not None:
+            counts[idx] = counts.get(idx, 0) + 1
+
+    scores = fast["intercept"]
+    if counts:
+        ids = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * fast["idf"][ids]
+        weights /= np.linalg.norm(weights)
+        scores = (fast["qcoef"][:, ids] @ weights) * fast["scale"] + scores
+
+    # Binary LR has a single decision column: positive score means classes_[1]
+    if scores.shape[0] == 1:
+        return fast["classes"][int(scores[0] > 0)]
+    return fast["classes"][int(np.argmax(scores))]
+
 def predict_category(text):
     """
     Predict category for a given complaint text.
+    Uses the model cached at import instead of reloading it from disk.
+    Standard TF-IDF + LR pipelines are scored directly with NumPy; other
+    pipelines go through model.predict, with concurrent calls batched.
     """
-    if not os.path.exists(MODEL_PATH):
+    if _MODEL is None:
         raise FileNotFoundError(f"Model not found at {MODEL_PATH}. Run train_model() first.")
-    
-    model = joblib.load(MODEL_PATH)
-    return model.predict([text])[0]
+
+    fast = _FAST_MODEL
+    if fast is not None:
+        return _fast_predict(fast, text)
+
+    _ensure_batch_thread()
+    item = {"text": text, "done": threading.Event(), "result": None, "error": None}
+    _predict_queue.put(item)
+    item["done"].wait()
+    if item["error"] is not None:
+        raise item["error"]
+    return item["result"]
 
 # ----- 3. Extract text from image -----
 def extract_text_from_image(image_path):
@@ -77,7 +303,7 @@ def extract_text_from_image(image_path):
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image file not found: {image_path}")
 
-    result = reader.readtext(image_path, detail=0)
+    result = _get_reader().readtext(image_path, detail=0)
     extracted_text = " ".join(result)
     return extracted_text
 
@@ -89,7 +315,9 @@ def transcribe_audio(audio_path):
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
-    result = model_whisper.transcribe(audio_path)
+    model = _get_whisper()
+    # FP16 only helps (and is only supported) on GPU
+    result = model.transcribe(audio_path, fp16=model.device.type == "cuda")
     return result.get("text", "")
 
 # ----- 5. Optional: test functions -----
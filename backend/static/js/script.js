@@ -0,0 +1,34 @@
+// Poll the status endpoint until the submitted complaint has been categorized
+(function () {
+  var message = document.getElementById("message");
+  if (!message || !message.dataset.statusUrl) {
+    return;
+  }
+
+  var MAX_ATTEMPTS = 60;  // about two minutes at the normal interval
+  var attempts = 0;
+
+  function retry(delay) {
+    attempts += 1;
+    if (attempts >= MAX_ATTEMPTS) {
+      message.textContent = "✅ Complaint submitted! Still processing, please check back later.";
+      return;
+    }
+    setTimeout(poll, delay);
+  }
+
+  function poll() {
+    fetch(message.dataset.statusUrl)
+      .then(function (resp) { return resp.json(); })
+      .then(function (data) {
+        if (data.done) {
+          message.textContent = "✅ Complaint submitted! Predicted category: " + data.category;
+        } else {
+          retry(2000);
+        }
+      })
+      .catch(function () { retry(5000); });
+  }
+
+  poll();
+})();